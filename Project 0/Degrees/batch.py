@@ -0,0 +1,195 @@
+"""
+Batch mode for degrees.py: answers many source/target pairs in one run.
+
+Queries are read from a file with one tab-separated pair per line; each
+side is either an IMDb person id or a name. Queries sharing a source are
+answered from a single breadth-first search tree, and results are
+written as JSON lines as soon as each source group is done.
+
+With `jobs` > 1 the source groups are spread over a process pool. The
+graph is not pickled per task: forked workers inherit it copy-on-write,
+and elsewhere each worker memory-maps the same snapshot file once.
+"""
+
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+
+from graph import Graph
+from lookup import choose_person, name_index
+from search import SEARCHES, paths_from
+
+# Graph searched by pool workers, inherited on fork or set by init_worker
+worker_graph = None
+
+
+def read_queries(path):
+    """
+    Returns (line_number, source, target) tuples from a query file.
+    `path` may be "-" for standard input. Blank lines and lines starting
+    with "#" are skipped.
+    """
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    queries = []
+    try:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split("\t")
+            if len(fields) != 2:
+                raise ValueError(f"line {number}: expected source<TAB>target")
+            queries.append((number, fields[0].strip(), fields[1].strip()))
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return queries
+
+
+def resolve_person(graph, text, policy="error", fuzzy=False):
+    """
+    Resolves a person id or name to a person index.
+    Returns (index, None) on success or (None, error message).
+
+    Names shared by several people are settled by `policy` (see
+    lookup.choose_person). With `fuzzy`, a name with no exact match
+    resolves to the most similar name in the trigram index.
+    """
+    index = graph.person_ids.find(text)
+    if index is not None:
+        return index, None
+    matches = graph.people_named(text)
+    if not matches and fuzzy:
+        similar = name_index(graph).search(text, limit=1)
+        if similar:
+            matches = similar[0][1]
+    if len(matches) == 1:
+        return matches[0], None
+    if not matches:
+        return None, "person not found"
+    person = choose_person(graph, matches, policy)
+    if person is None:
+        return None, "ambiguous name"
+    return person, None
+
+
+def run_batch(graph, queries, output, mode="bidirectional", jobs=1,
+              policy="error", fuzzy=False):
+    """
+    Answers `queries` against `graph`, writing one JSON object per query
+    to `output`. Results are grouped by source, not in input order; each
+    record carries the `line` it answers. The output order is the same
+    for any number of `jobs`. `policy` and `fuzzy` control name
+    resolution as in `resolve_person`.
+    """
+    groups = {}
+    for line, source_text, target_text in queries:
+        source, error = resolve_person(graph, source_text, policy, fuzzy)
+        if error is None:
+            target, error = resolve_person(graph, target_text, policy, fuzzy)
+        if error is not None:
+            write_result(output, line, source_text, target_text, error=error)
+            continue
+        groups.setdefault(source, []).append(
+            (line, source_text, target_text, target)
+        )
+
+    tasks = [(source, sorted({query[3] for query in group}), mode)
+             for source, group in groups.items()]
+    if jobs > 1 and len(tasks) > 1:
+        results = parallel_results(graph, tasks, jobs)
+    else:
+        results = (search_group(graph, *task) for task in tasks)
+
+    for paths, group in zip(results, groups.values()):
+        for line, source_text, target_text, target in group:
+            write_result(output, line, source_text, target_text,
+                         path=paths[target])
+        output.flush()
+
+
+def search_group(graph, source, targets, mode):
+    """
+    Returns a dict mapping each target to its path from `source` as
+    (movie_id, person_id) pairs.
+
+    Several targets share one breadth-first search; a single target
+    uses the search selected by `mode`.
+    """
+    if len(targets) == 1:
+        target = targets[0]
+        paths = {target: SEARCHES[mode](graph, source, target)}
+    else:
+        paths = paths_from(graph, source, targets)
+    return {target: graph.path_ids(path) for target, path in paths.items()}
+
+
+def parallel_results(graph, tasks, jobs):
+    """
+    Yields `search_group` results for `tasks` in order, computed by a
+    pool of `jobs` worker processes.
+    """
+    chunksize = max(1, len(tasks) // (jobs * 8))
+    with worker_context(graph) as (context, initargs):
+        with context.Pool(jobs, initializer=init_worker,
+                          initargs=initargs) as pool:
+            yield from pool.imap(answer_group, tasks, chunksize)
+
+
+@contextlib.contextmanager
+def worker_context(graph):
+    """
+    Prepares worker processes to share `graph` and yields the
+    multiprocessing context and `init_worker` arguments to start them.
+
+    Forked workers inherit `graph`; spawned workers each map a snapshot
+    file, so the graph itself is never pickled. A graph that was not
+    loaded from a snapshot is written to a temporary one first.
+    """
+    global worker_graph
+    temporary = None
+    try:
+        if "fork" in multiprocessing.get_all_start_methods():
+            worker_graph = graph
+            yield multiprocessing.get_context("fork"), ()
+        else:
+            snapshot_path = graph.snapshot_path
+            if snapshot_path is None:
+                fd, temporary = tempfile.mkstemp(suffix=".snapshot")
+                os.close(fd)
+                graph.save(temporary, [0] * 6)
+                snapshot_path = temporary
+            yield multiprocessing.get_context("spawn"), (snapshot_path,)
+    finally:
+        worker_graph = None
+        if temporary is not None:
+            os.remove(temporary)
+
+
+def init_worker(snapshot_path=None):
+    """
+    Gives a spawned worker its graph by mapping the snapshot file.
+    """
+    global worker_graph
+    if snapshot_path is not None:
+        worker_graph = Graph.load(snapshot_path)
+
+
+def answer_group(task):
+    return search_group(worker_graph, *task)
+
+
+def write_result(output, line, source, target, path=None, error=None):
+    """
+    Writes one JSON line describing the answer to a query.
+    """
+    record = {"line": line, "source": source, "target": target}
+    if error is not None:
+        record["error"] = error
+    else:
+        record["degrees"] = None if path is None else len(path)
+        record["path"] = path
+    output.write(json.dumps(record) + "\n")
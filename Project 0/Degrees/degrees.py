@@ -1,66 +1,85 @@
-import csv
+import argparse
+import os
 import sys
 
-from util import Node, StackFrontier, QueueFrontier
+from batch import read_queries, run_batch
+from graph import Graph
+from landmarks import LANDMARKS_NAME, LandmarkIndex, build_index
+from lookup import POLICIES, find_people
+from search import SEARCHES, all_shortest_paths, k_shortest_paths, separation
 
-# Maps names to a set of corresponding person_ids
-names = {}
-
-# Maps person_ids to a dictionary of: name, birth, movies (a set of movie_ids)
-people = {}
-
-# Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
-movies = {}
+# Compact person/movie graph, see graph.py
+graph = None
 
 
 def load_data(directory):
     """
     Load data from CSV files into memory.
+
+    The parsed graph is cached in a snapshot inside `directory` and
+    memory-mapped on later runs, until any of the CSV files change.
+    A landmark index built for the same data is loaded if present.
     """
-    # Load people
-    with open(f"{directory}/people.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            people[row["id"]] = {
-                "name": row["name"],
-                "birth": row["birth"],
-                "movies": set()
-            }
-            if row["name"].lower() not in names:
-                names[row["name"].lower()] = {row["id"]}
-            else:
-                names[row["name"].lower()].add(row["id"])
-
-    # Load movies
-    with open(f"{directory}/movies.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            movies[row["id"]] = {
-                "title": row["title"],
-                "year": row["year"],
-                "stars": set()
-            }
-
-    # Load stars
-    with open(f"{directory}/stars.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                people[row["person_id"]]["movies"].add(row["movie_id"])
-                movies[row["movie_id"]]["stars"].add(row["person_id"])
-            except KeyError:
-                pass
+    global graph
+    graph = Graph.cached(directory)
+    graph.landmarks = LandmarkIndex.load(
+        os.path.join(directory, LANDMARKS_NAME), graph
+    )
 
 
 def main():
-    print(len(sys.argv))
-    if len(sys.argv) < 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    parser = argparse.ArgumentParser(
+        description="Find the degrees of separation between two actors."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--mode", choices=sorted(SEARCHES),
+                        default="bidirectional", help="search algorithm")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="answer tab-separated source/target pairs "
+                             "from FILE (- for stdin) as JSON lines")
+    parser.add_argument("--jobs", type=non_negative, default=1, metavar="N",
+                        help="worker processes for --batch (0 for one per CPU)")
+    parser.add_argument("--ambiguous", choices=POLICIES, default="error",
+                        help="how --batch resolves names shared by "
+                             "several people")
+    parser.add_argument("--fuzzy", action="store_true",
+                        help="let --batch match misspelled names")
+    parser.add_argument("--build-landmarks", type=non_negative, metavar="K",
+                        help="build a landmark index of K people and exit")
+    parser.add_argument("--components", action="store_true",
+                        help="print connected component sizes and exit")
+    args = parser.parse_args()
+
+    if args.components:
+        load_data(args.directory)
+        sizes = sorted(graph.component_sizes, reverse=True)
+        print(f"{len(sizes)} components, {sizes.count(1)} of a single person.")
+        print("Largest:", ", ".join(str(size) for size in sizes[:10]))
+        return
+
+    if args.build_landmarks is not None:
+        load_data(args.directory)
+        index, seconds, size = build_index(
+            graph, args.directory, args.build_landmarks
+        )
+        print(f"Built {len(index.landmarks)} landmarks in {seconds:.2f}s, "
+              f"{size} bytes.")
+        return
+
+    if args.batch is not None:
+        try:
+            queries = read_queries(args.batch)
+        except (OSError, ValueError) as e:
+            sys.exit(str(e))
+        load_data(args.directory)
+        jobs = args.jobs or os.cpu_count()
+        run_batch(graph, queries, sys.stdout, mode=args.mode, jobs=jobs,
+                  policy=args.ambiguous, fuzzy=args.fuzzy)
+        return
 
     # Load data from files into memory
     print("Loading data...")
-    load_data(directory)
+    load_data(args.directory)
     print("Data loaded.")
 
     source = person_id_for_name(input("Name: "))
@@ -70,7 +89,7 @@ def main():
     if target is None:
         sys.exit("Person not found.")
 
-    path = shortest_path(source, target)
+    path = shortest_path(source, target, mode=args.mode)
 
     if path is None:
         print("Not connected.")
@@ -79,56 +98,66 @@ def main():
         print(f"{degrees} degrees of separation.")
         path = [(None, source)] + path
         for i in range(degrees):
-            person1 = people[path[i][1]]["name"]
-            person2 = people[path[i + 1][1]]["name"]
-            movie = movies[path[i + 1][0]]["title"]
+            person1 = graph.person_names[graph.person(path[i][1])]
+            person2 = graph.person_names[graph.person(path[i + 1][1])]
+            movie = graph.titles[graph.movie(path[i + 1][0])]
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 
-def shortest_path(source, target):
+def non_negative(text):
+    """
+    Parses a count option, which must be a non-negative integer.
+    """
+    jobs = int(text)
+    if jobs < 0:
+        raise argparse.ArgumentTypeError("must be 0 or more")
+    return jobs
+
+
+def shortest_path(source, target, mode="bidirectional"):
     """
     Returns the shortest list of (movie_id, person_id) pairs
     that connect the source to the target.
 
     If no possible path, returns None.
-    """
 
-    frontier = QueueFrontier()
-    start = Node(state = source, parent = None, action = None) # action contains the movie id while state contains person id 
-    frontier.add(start)
-
-    explored = set()
-    solution = None
-
-    while True:
+    `mode` selects the search: "bfs" expands outward from the source
+    only, "bidirectional" grows a frontier from each end and stops
+    where they meet.
+    """
+    source = graph.person(source)
+    target = graph.person(target)
+    if mode not in SEARCHES:
+        raise ValueError(f"unknown search mode: {mode}")
+    return graph.path_ids(SEARCHES[mode](graph, source, target))
 
-        if frontier.empty():
-            return None
 
-        node = frontier.remove()
+def shortest_paths(source, target):
+    """
+    Lazily yields every shortest path between two people, each as a
+    list of (movie_id, person_id) pairs like `shortest_path`.
+    """
+    for path in all_shortest_paths(graph, graph.person(source),
+                                   graph.person(target)):
+        yield graph.path_ids(path)
 
-        if node.state == target:
-            x = soln(node)
-            return x
 
-        explored.add(node.state)
-        
-        for movie, state in neighbors_for_person(node.state):
-            if state not in explored and not frontier.contains_state(state):
-                child = Node(state = state, parent = node, action = movie)
-                if child.state == target:
-                    x = soln(child)
-                    return x
-                frontier.add(child)
+def simple_paths(source, target, k=None):
+    """
+    Lazily yields up to `k` simple paths between two people, shortest
+    first, each as a list of (movie_id, person_id) pairs.
+    """
+    for path in k_shortest_paths(graph, graph.person(source),
+                                 graph.person(target), k):
+        yield graph.path_ids(path)
 
 
-def soln(node):
-    solution = []
-    while node.parent is not None:
-        solution.append((node.action, node.state))
-        node = node.parent
-    solution.reverse()
-    return solution
+def degrees_of_separation(source, target):
+    """
+    Returns how many degrees apart two people are, or None if they are
+    not connected. Uses only the landmark index when its bounds agree.
+    """
+    return separation(graph, graph.person(source), graph.person(target))
 
 
 def person_id_for_name(name):
@@ -136,15 +165,21 @@ def person_id_for_name(name):
     Returns the IMDB id for a person's name,
     resolving ambiguities as needed.
     """
-    person_ids = list(names.get(name.lower(), set()))
+    person_ids = [graph.person_ids[person]
+                  for person in graph.people_named(name)]
     if len(person_ids) == 0:
+        suggestions = find_people(graph, name, limit=5)
+        if suggestions:
+            names = dict.fromkeys(graph.person_names[person]
+                                  for person in suggestions)
+            print(f"Did you mean: {', '.join(names)}?")
         return None
     elif len(person_ids) > 1:
         print(f"Which '{name}'?")
         for person_id in person_ids:
-            person = people[person_id]
-            name = person["name"]
-            birth = person["birth"]
+            person = graph.person(person_id)
+            name = graph.person_names[person]
+            birth = graph.births[person]
             print(f"ID: {person_id}, Name: {name}, Birth: {birth}")
         try:
             person_id = input("Intended Person ID: ")
@@ -162,11 +197,9 @@ def neighbors_for_person(person_id):
     Returns (movie_id, person_id) pairs for people
     who starred with a given person.
     """
-    movie_ids = people[person_id]["movies"]
     neighbors = set()
-    for movie_id in movie_ids:
-        for person_id in movies[movie_id]["stars"]:
-            neighbors.add((movie_id, person_id))
+    for movie, person in graph.neighbors(graph.person(person_id)):
+        neighbors.add((graph.movie_ids[movie], graph.person_ids[person]))
     return neighbors
 
 
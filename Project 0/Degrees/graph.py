@@ -0,0 +1,501 @@
+"""
+Compact in-memory storage for the Degrees dataset.
+
+People and movies are interned to dense integers (their row order in
+people.csv and movies.csv). The star relation is kept in CSR form
+(compressed sparse rows): for each direction an offsets array and one
+flat index array, so the movies of person `p` are
+`person_movies[person_offsets[p]:person_offsets[p + 1]]`.
+Strings live in `StringTable`s, one UTF-8 blob per column.
+
+A loaded graph can be written to a binary snapshot next to the CSV
+files; later runs memory-map the snapshot instead of parsing the CSVs.
+"""
+
+import csv
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+# Snapshot file written next to the CSV files
+SNAPSHOT_NAME = "degrees.snapshot"
+
+# Bump whenever the snapshot layout changes
+SNAPSHOT_VERSION = 2
+SNAPSHOT_MAGIC = b"DEGSNAP\0"
+
+# Magic, version, little-endian flag, then (mtime_ns, size) per CSV file
+SNAPSHOT_HEADER = struct.Struct("<8sIB3x6q")
+
+# Typecode and item count preceding each array in a snapshot
+SECTION_HEADER = struct.Struct("<c7xq")
+
+CSV_FILES = ("people.csv", "movies.csv", "stars.csv")
+
+
+class StringTable():
+    """
+    Immutable sequence of strings stored as a single UTF-8 blob plus an
+    offsets array. `order` is a permutation of the rows sorted by value
+    (lowercased when `folded` is True) and is used for lookups.
+    """
+
+    def __init__(self, blob, offsets, order, folded=False):
+        self.blob = blob
+        self.offsets = offsets
+        self.order = order
+        self.folded = folded
+
+    @classmethod
+    def build(cls, strings, folded=False):
+        """
+        Builds a table from a list of strings.
+        """
+        blob = bytearray()
+        offsets = array("q", [0])
+        for string in strings:
+            blob += string.encode("utf-8")
+            offsets.append(len(blob))
+        if folded:
+            order = sorted(range(len(strings)), key=lambda i: strings[i].lower())
+        else:
+            order = sorted(range(len(strings)), key=strings.__getitem__)
+        return cls(bytes(blob), offsets, array("i", order), folded)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        start = self.offsets[index]
+        end = self.offsets[index + 1]
+        return str(self.blob[start:end], "utf-8")
+
+    def key(self, index):
+        """
+        Returns the value row `index` is sorted by.
+        """
+        value = self[index]
+        return value.lower() if self.folded else value
+
+    def lower_bound(self, value):
+        """
+        Returns the first position in `order` whose key is >= value.
+        """
+        low, high = 0, len(self.order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(self.order[middle]) < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find_all(self, value):
+        """
+        Returns the rows whose key equals `value`.
+        """
+        if self.folded:
+            value = value.lower()
+        rows = []
+        position = self.lower_bound(value)
+        while position < len(self.order):
+            row = self.order[position]
+            if self.key(row) != value:
+                break
+            rows.append(row)
+            position += 1
+        return rows
+
+    def find_prefix(self, prefix, limit=None):
+        """
+        Returns rows whose key starts with `prefix`, in sorted order,
+        stopping after `limit` rows if given.
+        """
+        if self.folded:
+            prefix = prefix.lower()
+        rows = []
+        position = self.lower_bound(prefix)
+        while position < len(self.order) and (limit is None or len(rows) < limit):
+            row = self.order[position]
+            if not self.key(row).startswith(prefix):
+                break
+            rows.append(row)
+            position += 1
+        return rows
+
+    def find(self, value):
+        """
+        Returns the first row whose key equals `value`, or None.
+        """
+        rows = self.find_all(value)
+        return rows[0] if rows else None
+
+
+class Graph():
+    """
+    Bipartite person/movie graph with integer ids and CSR adjacency.
+    """
+
+    # Attributes holding StringTables and plain integer arrays, in the
+    # order they are stored in a snapshot
+    string_columns = ("person_ids", "person_names", "births",
+                      "movie_ids", "titles", "years")
+    array_columns = ("person_offsets", "person_movies",
+                     "movie_offsets", "movie_stars",
+                     "components", "component_sizes")
+
+    def __init__(self, person_ids, person_names, births,
+                 movie_ids, titles, years,
+                 person_offsets, person_movies, movie_offsets, movie_stars,
+                 components, component_sizes):
+        self.person_ids = person_ids
+        self.person_names = person_names
+        self.births = births
+        self.movie_ids = movie_ids
+        self.titles = titles
+        self.years = years
+        self.person_offsets = person_offsets
+        self.person_movies = person_movies
+        self.movie_offsets = movie_offsets
+        self.movie_stars = movie_stars
+
+        # Connected component label of each person, and people per label
+        self.components = components
+        self.component_sizes = component_sizes
+
+        # Memory map backing the arrays when loaded from a snapshot
+        self.buffer = None
+        self.snapshot_path = None
+
+        # Optional LandmarkIndex, see landmarks.py
+        self.landmarks = None
+
+        # TrigramIndex over person names, built on first use (lookup.py)
+        self.name_index = None
+
+    @classmethod
+    def from_csv(cls, directory):
+        """
+        Loads people.csv, movies.csv and stars.csv from `directory`.
+        """
+        person_ids, person_names, births = [], [], []
+        with open(f"{directory}/people.csv", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                person_ids.append(row["id"])
+                person_names.append(row["name"])
+                births.append(row["birth"])
+
+        movie_ids, titles, years = [], [], []
+        with open(f"{directory}/movies.csv", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                movie_ids.append(row["id"])
+                titles.append(row["title"])
+                years.append(row["year"])
+
+        # Only needed while the star rows are translated to integers
+        person_index = {person_id: i for i, person_id in enumerate(person_ids)}
+        movie_index = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+        star_people = array("i")
+        star_movies = array("i")
+        with open(f"{directory}/stars.csv", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    person = person_index[row["person_id"]]
+                    movie = movie_index[row["movie_id"]]
+                except KeyError:
+                    continue
+                star_people.append(person)
+                star_movies.append(movie)
+        del person_index, movie_index
+
+        components, component_sizes = label_components(
+            len(person_ids), len(movie_ids), star_people, star_movies
+        )
+        person_offsets, person_movies = build_csr(
+            len(person_ids), star_people, star_movies
+        )
+        movie_offsets, movie_stars = build_csr(
+            len(movie_ids), star_movies, star_people
+        )
+        return cls(
+            StringTable.build(person_ids),
+            StringTable.build(person_names, folded=True),
+            StringTable.build(births),
+            StringTable.build(movie_ids),
+            StringTable.build(titles),
+            StringTable.build(years),
+            person_offsets, person_movies, movie_offsets, movie_stars,
+            components, component_sizes
+        )
+
+    @classmethod
+    def cached(cls, directory):
+        """
+        Loads the graph for `directory` from its snapshot if the snapshot
+        matches the current CSV files, otherwise parses the CSV files and
+        writes a fresh snapshot.
+        """
+        path = os.path.join(directory, SNAPSHOT_NAME)
+        signature = csv_signature(directory)
+        graph = cls.load(path, signature)
+        if graph is None:
+            graph = cls.from_csv(directory)
+            try:
+                graph.save(path, signature)
+            except OSError:
+                # Read-only data directories still work, just uncached
+                pass
+        return graph
+
+    @classmethod
+    def load(cls, path, signature=None):
+        """
+        Memory-maps a snapshot written by `save`.
+
+        Returns None if the file is missing, was written by another
+        snapshot version or byte order, or (when `signature` is given)
+        was built from different CSV files.
+        """
+        try:
+            with open(path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(buffer) < SNAPSHOT_HEADER.size:
+            return None
+        magic, version, little, *stored = SNAPSHOT_HEADER.unpack_from(buffer)
+        if (magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION
+                or little != (sys.byteorder == "little")):
+            return None
+        if signature is not None and tuple(stored) != tuple(signature):
+            return None
+
+        view = memoryview(buffer)
+        position = SNAPSHOT_HEADER.size
+
+        def section():
+            nonlocal position
+            typecode, count = SECTION_HEADER.unpack_from(view, position)
+            typecode = typecode.decode("ascii")
+            position += SECTION_HEADER.size
+            size = count * array(typecode).itemsize
+            if count < 0 or position + size > len(view):
+                raise ValueError("truncated snapshot section")
+            data = view[position:position + size].cast(typecode)
+            position += size + (-size % 8)
+            return data
+
+        # A valid header does not guarantee intact sections, e.g. after
+        # a partial copy; any damage means the snapshot is rebuilt
+        try:
+            columns = []
+            for _ in cls.string_columns:
+                blob, offsets, order, flags = (section(), section(),
+                                               section(), section())
+                if (len(flags) != 1 or len(offsets) != len(order) + 1
+                        or offsets[-1] != len(blob)):
+                    raise ValueError("inconsistent string table")
+                columns.append(StringTable(blob, offsets, order, bool(flags[0])))
+            for _ in cls.array_columns:
+                columns.append(section())
+        except (struct.error, ValueError, TypeError):
+            return None
+        (person_offsets, person_movies, movie_offsets, movie_stars,
+         components, component_sizes) = columns[6:]
+        if (len(person_offsets) != len(columns[0]) + 1
+                or len(movie_offsets) != len(columns[3]) + 1
+                or person_offsets[-1] != len(person_movies)
+                or movie_offsets[-1] != len(movie_stars)
+                or len(components) != len(columns[0])
+                or sum(component_sizes) != len(components)):
+            return None
+
+        graph = cls(*columns)
+        graph.buffer = buffer
+        graph.snapshot_path = path
+        return graph
+
+    def save(self, path, signature):
+        """
+        Writes the graph to a snapshot at `path`, tagged with the
+        `signature` of the CSV files it was built from.
+        """
+        sections = []
+        for name in self.string_columns:
+            table = getattr(self, name)
+            sections += [table.blob, table.offsets, table.order,
+                         array("B", [table.folded])]
+        for name in self.array_columns:
+            sections.append(getattr(self, name))
+
+        temporary = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary, "wb") as f:
+                f.write(SNAPSHOT_HEADER.pack(
+                    SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                    sys.byteorder == "little", *signature
+                ))
+                for data in sections:
+                    data = memoryview(data)
+                    f.write(SECTION_HEADER.pack(
+                        data.format.encode("ascii"), len(data)
+                    ))
+                    f.write(data)
+                    f.write(bytes(-data.nbytes % 8))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    @property
+    def person_count(self):
+        return len(self.person_offsets) - 1
+
+    @property
+    def movie_count(self):
+        return len(self.movie_offsets) - 1
+
+    def connected(self, a, b):
+        """
+        Returns True if there is any path between two person indices.
+        """
+        return self.components[a] == self.components[b]
+
+    def person(self, person_id):
+        """
+        Returns the integer index of an IMDb person id.
+        Raises KeyError if the person is unknown.
+        """
+        index = self.person_ids.find(person_id)
+        if index is None:
+            raise KeyError(person_id)
+        return index
+
+    def movie(self, movie_id):
+        """
+        Returns the integer index of an IMDb movie id.
+        Raises KeyError if the movie is unknown.
+        """
+        index = self.movie_ids.find(movie_id)
+        if index is None:
+            raise KeyError(movie_id)
+        return index
+
+    def people_named(self, name):
+        """
+        Returns the indices of every person with `name`, ignoring case.
+        """
+        return self.person_names.find_all(name)
+
+    def degree(self, person):
+        """
+        Returns how many movies a person starred in.
+        """
+        return self.person_offsets[person + 1] - self.person_offsets[person]
+
+    def movies_of(self, person):
+        return self.person_movies[
+            self.person_offsets[person]:self.person_offsets[person + 1]
+        ]
+
+    def stars_of(self, movie):
+        return self.movie_stars[
+            self.movie_offsets[movie]:self.movie_offsets[movie + 1]
+        ]
+
+    def path_ids(self, path):
+        """
+        Translates a path of (movie, person) indices into IMDb ids.
+        """
+        if path is None:
+            return None
+        return [(self.movie_ids[movie], self.person_ids[person])
+                for movie, person in path]
+
+    def neighbors(self, person):
+        """
+        Yields (movie, person) index pairs for everyone who starred
+        with `person`, including `person` themselves.
+        """
+        for movie in self.movies_of(person):
+            for star in self.stars_of(movie):
+                yield movie, star
+
+
+def csv_signature(directory):
+    """
+    Returns (mtime_ns, size) for each CSV file, used to detect stale
+    snapshots.
+    """
+    signature = []
+    for name in CSV_FILES:
+        stat = os.stat(os.path.join(directory, name))
+        signature += [stat.st_mtime_ns, stat.st_size]
+    return signature
+
+
+def label_components(person_count, movie_count, star_people, star_movies):
+    """
+    Finds connected components with union-find over the star rows, where
+    people and movies are the nodes (movie `m` is node person_count + m).
+
+    Returns (components, component_sizes): a dense component label for
+    every person, numbered in order of each component's first person,
+    and the number of people carrying each label.
+    """
+    parent = array("i", range(person_count + movie_count))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for person, movie in zip(star_people, star_movies):
+        a = find(person)
+        b = find(person_count + movie)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    labels = {}
+    components = array("i", [0]) * person_count
+    component_sizes = array("i")
+    for person in range(person_count):
+        root = find(person)
+        label = labels.get(root)
+        if label is None:
+            label = labels[root] = len(component_sizes)
+            component_sizes.append(0)
+        components[person] = label
+        component_sizes[label] += 1
+    return components, component_sizes
+
+
+def build_csr(count, rows, columns):
+    """
+    Groups `columns` by `rows` (both integer arrays of equal length)
+    into CSR `(offsets, indices)` for `count` rows. Indices within a
+    row are sorted and duplicates are dropped.
+    """
+    offsets = array("i", [0]) * (count + 1)
+    for row in rows:
+        offsets[row + 1] += 1
+    for row in range(count):
+        offsets[row + 1] += offsets[row]
+
+    indices = array("i", [0]) * len(rows)
+    cursor = offsets[:-1]
+    for row, column in zip(rows, columns):
+        indices[cursor[row]] = column
+        cursor[row] += 1
+
+    compact_offsets = array("i", [0])
+    compact = array("i")
+    for row in range(count):
+        compact.extend(sorted(set(indices[offsets[row]:offsets[row + 1]])))
+        compact_offsets.append(len(compact))
+    return compact_offsets, compact
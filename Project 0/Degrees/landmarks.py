@@ -0,0 +1,199 @@
+"""
+Landmark distance oracle for the Degrees graph.
+
+A handful of well-connected people are chosen as landmarks and their
+breadth-first distance to everyone else is stored, one byte per person.
+By the triangle inequality, for any landmark L
+
+    |d(L, s) - d(L, t)|  <=  d(s, t)  <=  d(L, s) + d(L, t)
+
+so the index gives bounds on the separation of any pair without
+searching, proves disconnection when a landmark reaches exactly one of
+the two, and lets the bidirectional search prune people who cannot lie
+on a path within the upper bound.
+"""
+
+import math
+import mmap
+import os
+import struct
+import time
+from array import array
+
+# Index file written next to the CSV files
+LANDMARKS_NAME = "degrees.landmarks"
+
+LANDMARKS_VERSION = 1
+LANDMARKS_MAGIC = b"DEGLMRK\0"
+
+# Magic, version, landmark count, then the graph shape it was built for:
+# people, movies and star entries
+LANDMARKS_HEADER = struct.Struct("<8sIIqqq")
+
+# Distance stored for people a landmark cannot reach
+UNREACHABLE = 255
+
+
+class LandmarkIndex():
+    """
+    Distances from each landmark to every person, as one byte array per
+    landmark (UNREACHABLE where there is no path).
+    """
+
+    def __init__(self, landmarks, distances, shape):
+        self.landmarks = landmarks
+        self.distances = distances
+        self.shape = shape
+
+        # Memory map backing `distances` when loaded from a file
+        self.buffer = None
+
+    @classmethod
+    def build(cls, graph, count=16):
+        """
+        Picks the `count` people with the most movies as landmarks and
+        runs a breadth-first search from each of them.
+        """
+        landmarks = sorted(range(graph.person_count),
+                           key=lambda p: (-graph.degree(p), p))[:count]
+        distances = [distances_from(graph, landmark) for landmark in landmarks]
+        return cls(array("i", landmarks), distances, graph_shape(graph))
+
+    @classmethod
+    def load(cls, path, graph):
+        """
+        Memory-maps an index written by `save`. Returns None if the file
+        is missing, damaged, or was built for a different graph.
+        """
+        try:
+            with open(path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        try:
+            magic, version, count, *shape = LANDMARKS_HEADER.unpack_from(buffer)
+        except struct.error:
+            return None
+        people = graph.person_count
+        size = LANDMARKS_HEADER.size + count * 4 + count * people
+        if (magic != LANDMARKS_MAGIC or version != LANDMARKS_VERSION
+                or tuple(shape) != graph_shape(graph) or len(buffer) != size):
+            return None
+
+        view = memoryview(buffer)
+        position = LANDMARKS_HEADER.size
+        landmarks = view[position:position + count * 4].cast("i")
+        position += count * 4
+        distances = []
+        for _ in range(count):
+            distances.append(view[position:position + people])
+            position += people
+        index = cls(landmarks, distances, tuple(shape))
+        index.buffer = buffer
+        return index
+
+    def save(self, path):
+        """
+        Writes the index to `path`, replacing any existing file.
+        """
+        temporary = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary, "wb") as f:
+                f.write(LANDMARKS_HEADER.pack(
+                    LANDMARKS_MAGIC, LANDMARKS_VERSION,
+                    len(self.landmarks), *self.shape
+                ))
+                f.write(array("i", self.landmarks))
+                for distances in self.distances:
+                    f.write(distances)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    @property
+    def nbytes(self):
+        return 4 * len(self.landmarks) + sum(len(d) for d in self.distances)
+
+    def bounds(self, source, target):
+        """
+        Returns (lower, upper) bounds on the degrees of separation between
+        two people. Lower is math.inf when they are provably not
+        connected; upper is math.inf when no landmark reaches them.
+        """
+        lower, upper = 0, math.inf
+        for distances in self.distances:
+            a = distances[source]
+            b = distances[target]
+            if a == UNREACHABLE or b == UNREACHABLE:
+                if a != b:
+                    return math.inf, math.inf
+                continue
+            lower = max(lower, abs(a - b))
+            upper = min(upper, a + b)
+        return lower, upper
+
+
+    def lower_bound_to(self, end, count=4):
+        """
+        Returns a function giving a lower bound on the distance from any
+        person to `end`, using the `count` landmarks that know `end` best
+        (closest to it) to keep each call cheap.
+        """
+        rows = [(distances, distances[end]) for distances in self.distances
+                if distances[end] != UNREACHABLE]
+        rows = sorted(rows, key=lambda row: row[1])[:count]
+
+        def lower_bound(person):
+            bound = 0
+            for distances, to_end in rows:
+                distance = distances[person]
+                if distance == UNREACHABLE:
+                    return math.inf
+                if abs(distance - to_end) > bound:
+                    bound = abs(distance - to_end)
+            return bound
+        return lower_bound
+
+
+def distances_from(graph, source):
+    """
+    Returns the breadth-first distance from `source` to every person.
+    """
+    distances = array("B", [UNREACHABLE]) * graph.person_count
+    distances[source] = 0
+    frontier = [source]
+    depth = 0
+    while frontier:
+        depth += 1
+        next_frontier = []
+        for person in frontier:
+            for _, neighbor in graph.neighbors(person):
+                if distances[neighbor] == UNREACHABLE and neighbor != source:
+                    if depth == UNREACHABLE:
+                        raise ValueError("separation too large to store in a byte")
+                    distances[neighbor] = depth
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+    return distances
+
+
+def graph_shape(graph):
+    """
+    Identifies the graph an index belongs to.
+    """
+    return (graph.person_count, graph.movie_count, len(graph.person_movies))
+
+
+def build_index(graph, directory, count=16):
+    """
+    Builds and saves the landmark index for `directory`.
+    Returns (index, seconds taken, bytes written).
+    """
+    start = time.perf_counter()
+    index = LandmarkIndex.build(graph, count)
+    path = os.path.join(directory, LANDMARKS_NAME)
+    index.save(path)
+    return index, time.perf_counter() - start, os.path.getsize(path)
@@ -0,0 +1,124 @@
+"""
+Name lookup beyond exact matches: prefix search, typo-tolerant search
+with a trigram index, and non-interactive disambiguation policies.
+
+Prefix search uses the sorted order already stored in the person name
+StringTable. The trigram index maps each three-character slice of a
+(lowercased, space-padded) name to the distinct names containing it;
+it is built on first use and kept on the graph.
+"""
+
+from array import array
+from collections import Counter
+
+# How ambiguous names are resolved outside interactive use
+POLICIES = ("error", "most-connected")
+
+# Minimum trigram similarity for a fuzzy match
+FUZZY_THRESHOLD = 0.3
+
+
+class TrigramIndex():
+    """
+    Inverted index from name trigrams to distinct lowercase names.
+    """
+
+    def __init__(self, names):
+        # Each distinct name is identified by the first position its
+        # rows take in `names.order`
+        self.names = names
+        self.starts = array("i")
+        self.trigram_counts = array("i")
+        postings = {}
+        previous = None
+        for position in range(len(names.order)):
+            key = names.key(names.order[position])
+            if key == previous:
+                continue
+            previous = key
+            name = len(self.starts)
+            self.starts.append(position)
+            grams = trigrams(key)
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, array("i")).append(name)
+        self.postings = postings
+
+    def search(self, text, limit=10):
+        """
+        Returns up to `limit` (similarity, rows) pairs for the names most
+        similar to `text`, best first, where `rows` are all people with
+        that name.
+        """
+        grams = trigrams(text.lower())
+        counts = Counter()
+        for gram in grams:
+            counts.update(self.postings.get(gram, ()))
+
+        scored = []
+        for name, common in counts.items():
+            similarity = common / (len(grams) + self.trigram_counts[name] - common)
+            if similarity >= FUZZY_THRESHOLD:
+                scored.append((-similarity, name))
+        scored.sort()
+
+        results = []
+        for negative, name in scored[:limit]:
+            results.append((-negative, self.rows(name)))
+        return results
+
+    def rows(self, name):
+        """
+        Returns every row sharing the distinct name `name`.
+        """
+        order = self.names.order
+        position = self.starts[name]
+        end = self.starts[name + 1] if name + 1 < len(self.starts) else len(order)
+        return [order[i] for i in range(position, end)]
+
+
+def trigrams(key):
+    """
+    Returns the set of trigrams of a lowercase name, padded so that
+    word starts and ends count too.
+    """
+    padded = f"  {' '.join(key.split())} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def name_index(graph):
+    """
+    Returns the graph's trigram index, building it on first use.
+    """
+    if graph.name_index is None:
+        graph.name_index = TrigramIndex(graph.person_names)
+    return graph.name_index
+
+
+def find_people(graph, text, limit=10):
+    """
+    Returns up to `limit` person indices matching `text`: exact name
+    matches first, then names starting with `text`, then names similar
+    to it.
+    """
+    found = list(graph.people_named(text))
+    for person in graph.person_names.find_prefix(text, limit):
+        if person not in found:
+            found.append(person)
+    if len(found) < limit:
+        for _, rows in name_index(graph).search(text, limit):
+            found.extend(person for person in rows if person not in found)
+    return found[:limit]
+
+
+def choose_person(graph, people, policy):
+    """
+    Picks one person from ambiguous `people` according to `policy`.
+    "most-connected" takes whoever starred in the most movies (lowest
+    index on ties); "error" declines and returns None.
+    """
+    if policy == "most-connected":
+        return min(people, key=lambda person: (-graph.degree(person), person))
+    if policy == "error":
+        return None
+    raise ValueError(f"unknown disambiguation policy: {policy}")
@@ -0,0 +1,437 @@
+"""
+Search algorithms over a `Graph` (see graph.py).
+
+Everything here works on integer person and movie indices; paths are
+lists of (movie, person) index pairs leading from the source (excluded)
+to the target (included), or None when the two are not connected.
+"""
+
+import math
+import threading
+import weakref
+from array import array
+import heapq
+import itertools
+from collections import deque
+
+# Largest mark value before a workspace's marks are cleared and reused
+MAX_MARK = 2 ** 31 - 1
+
+
+class Workspace():
+    """
+    Reusable arrays for searching one graph, indexed by person.
+
+    `marks[p]` records which search last discovered person p. Each
+    search takes fresh mark values instead of clearing the arrays, so
+    starting one is O(1) however large the graph is. `parent_person[p]`
+    and `parent_movie[p]` hold the step leading from p back towards the
+    root that discovered it, with -1 as the root's parent.
+    """
+
+    def __init__(self, size):
+        self.marks = array("i", [0]) * size
+        self.parent_person = array("i", [0]) * size
+        self.parent_movie = array("i", [0]) * size
+        self.mark = 0
+
+    def begin(self):
+        """
+        Returns two mark values no earlier search has used, one per
+        direction of a bidirectional search.
+        """
+        if self.mark + 2 > MAX_MARK:
+            self.marks = array("i", [0]) * len(self.marks)
+            self.mark = 0
+        self.mark += 2
+        return self.mark - 1, self.mark
+
+    def root(self, person, mark):
+        self.marks[person] = mark
+        self.parent_person[person] = -1
+
+    def trace(self, person):
+        """
+        Returns the path from the root that discovered `person` to it.
+        """
+        path = []
+        while self.parent_person[person] != -1:
+            path.append((self.parent_movie[person], person))
+            person = self.parent_person[person]
+        path.reverse()
+        return path
+
+    def trace_back(self, person):
+        """
+        Returns the path from `person` to the root that discovered it.
+        """
+        path = []
+        while self.parent_person[person] != -1:
+            path.append((self.parent_movie[person], self.parent_person[person]))
+            person = self.parent_person[person]
+        return path
+
+
+# Workspaces of the current thread, one per graph
+local = threading.local()
+
+
+def workspace(graph):
+    """
+    Returns this thread's workspace for `graph`, sized to its people.
+    """
+    spaces = getattr(local, "spaces", None)
+    if spaces is None:
+        spaces = local.spaces = weakref.WeakKeyDictionary()
+    space = spaces.get(graph)
+    if space is None or len(space.marks) < graph.person_count:
+        space = spaces[graph] = Workspace(graph.person_count)
+    return space
+
+
+def breadth_first_path(graph, source, target):
+    """
+    Breadth-first search from source, over person indices of `graph`.
+    """
+    if source == target:
+        return []
+    if not graph.connected(source, target):
+        return None
+
+    space = workspace(graph)
+    mark, _ = space.begin()
+    marks = space.marks
+    parent_person = space.parent_person
+    parent_movie = space.parent_movie
+    space.root(source, mark)
+
+    movies_of = graph.movies_of
+    stars_of = graph.stars_of
+    frontier = deque([source])
+    while frontier:
+        person = frontier.popleft()
+        for movie in movies_of(person):
+            for neighbor in stars_of(movie):
+                if marks[neighbor] == mark:
+                    continue
+                marks[neighbor] = mark
+                parent_person[neighbor] = person
+                parent_movie[neighbor] = movie
+                if neighbor == target:
+                    return space.trace(target)
+                frontier.append(neighbor)
+    return None
+
+
+def bidirectional_path(graph, source, target, index=None):
+    """
+    Bidirectional breadth-first search between source and target
+    person indices of `graph`.
+
+    Each round expands one full layer of whichever frontier is smaller,
+    so the search only visits people within about half the separation
+    of either end. Returns a list of (movie, person) index pairs, or None.
+
+    With a landmark `index` (see landmarks.py), provably disconnected
+    pairs return at once and people whose lower-bound distance to the
+    other end would exceed the pair's upper bound are never expanded.
+    """
+    if source == target:
+        return []
+    if not graph.connected(source, target):
+        return None
+
+    upper = math.inf
+    if index is not None:
+        lower, upper = index.bounds(source, target)
+        if lower == math.inf:
+            return None
+
+    space = workspace(graph)
+    forward, backward = space.begin()
+    space.root(source, forward)
+    space.root(target, backward)
+    forward_frontier = [source]
+    backward_frontier = [target]
+    forward_depth = backward_depth = 0
+
+    while forward_frontier and backward_frontier:
+        if len(forward_frontier) <= len(backward_frontier):
+            forward_depth += 1
+            keep = within_bound(index, target, forward_depth, upper)
+            forward_frontier, meeting = expand_frontier(
+                graph, space, forward_frontier, forward, backward, keep
+            )
+            if meeting is not None:
+                person, movie, other = meeting
+                return (space.trace(person) + [(movie, other)]
+                        + space.trace_back(other))
+        else:
+            backward_depth += 1
+            keep = within_bound(index, source, backward_depth, upper)
+            backward_frontier, meeting = expand_frontier(
+                graph, space, backward_frontier, backward, forward, keep
+            )
+            if meeting is not None:
+                person, movie, other = meeting
+                return (space.trace(other) + [(movie, person)]
+                        + space.trace_back(person))
+
+    return None
+
+
+def within_bound(index, end, depth, upper):
+    """
+    Returns a predicate telling whether a person discovered at `depth`
+    can still be on a path to `end` no longer than `upper`, or None when
+    there is nothing to prune against.
+    """
+    if index is None or upper == math.inf:
+        return None
+    lower_bound = index.lower_bound_to(end)
+    return lambda person: depth + lower_bound(person) <= upper
+
+
+def landmark_path(graph, source, target):
+    """
+    Bidirectional search pruned by the graph's landmark index, if any.
+    """
+    return bidirectional_path(graph, source, target, graph.landmarks)
+
+
+def expand_frontier(graph, space, frontier, mark, other_mark, keep=None):
+    """
+    Expands every person in `frontier` by one step, marking newly
+    discovered people with `mark` and recording their parents. People
+    for whom `keep` returns False are left unexplored.
+
+    Returns the next frontier and, once the opposite search (`other_mark`)
+    is reached, the meeting edge as (person, movie, other person), else
+    None. Because whole layers are expanded at a time, the first meeting
+    found always lies on a shortest path.
+    """
+    marks = space.marks
+    parent_person = space.parent_person
+    parent_movie = space.parent_movie
+    movies_of = graph.movies_of
+    stars_of = graph.stars_of
+    next_frontier = []
+    for person in frontier:
+        for movie in movies_of(person):
+            for neighbor in stars_of(movie):
+                seen = marks[neighbor]
+                if seen == mark:
+                    continue
+                if seen == other_mark:
+                    return next_frontier, (person, movie, neighbor)
+                if keep is not None and not keep(neighbor):
+                    continue
+                marks[neighbor] = mark
+                parent_person[neighbor] = person
+                parent_movie[neighbor] = movie
+                next_frontier.append(neighbor)
+    return next_frontier, None
+
+
+def paths_from(graph, source, targets):
+    """
+    Breadth-first search from source that stops once every person in
+    `targets` has been reached, so one search tree answers many queries.
+
+    Returns a dict mapping each target to its path (None if unreachable).
+    """
+    paths = {}
+    remaining = set()
+    for target in targets:
+        if target == source:
+            paths[target] = []
+        elif graph.connected(source, target):
+            remaining.add(target)
+        else:
+            paths[target] = None
+
+    space = workspace(graph)
+    mark, _ = space.begin()
+    marks = space.marks
+    parent_person = space.parent_person
+    parent_movie = space.parent_movie
+    space.root(source, mark)
+
+    movies_of = graph.movies_of
+    stars_of = graph.stars_of
+    frontier = [source]
+    while frontier and remaining:
+        next_frontier = []
+        for person in frontier:
+            for movie in movies_of(person):
+                for neighbor in stars_of(movie):
+                    if marks[neighbor] == mark:
+                        continue
+                    marks[neighbor] = mark
+                    parent_person[neighbor] = person
+                    parent_movie[neighbor] = movie
+                    next_frontier.append(neighbor)
+                    if neighbor in remaining:
+                        paths[neighbor] = space.trace(neighbor)
+                        remaining.discard(neighbor)
+        frontier = next_frontier
+
+    for target in remaining:
+        paths[target] = None
+    return paths
+
+
+def all_shortest_paths(graph, source, target):
+    """
+    Lazily yields every shortest path from source to target.
+
+    A breadth-first search records the depth of everyone closer to the
+    source than the target; the shortest paths are then exactly the
+    walks back from the target that step down one depth at a time, and
+    they are enumerated depth-first so only the current path is held in
+    memory. Paths through different shared movies count separately.
+    """
+    if source == target:
+        yield []
+        return
+    if not graph.connected(source, target):
+        return
+
+    depth = {source: 0}
+    frontier = [source]
+    while frontier and target not in depth:
+        next_frontier = []
+        for person in frontier:
+            for _, neighbor in graph.neighbors(person):
+                if neighbor not in depth:
+                    depth[neighbor] = depth[person] + 1
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+    if target not in depth:
+        return
+
+    def predecessors(person):
+        previous_depth = depth[person] - 1
+        for movie, neighbor in graph.neighbors(person):
+            if depth.get(neighbor) == previous_depth:
+                yield movie, neighbor
+
+    # `steps` holds the path from the current person to the target,
+    # in reverse; `people` and `choices` form the depth-first stack
+    steps = []
+    people = [target]
+    choices = [predecessors(target)]
+    while choices:
+        step = next(choices[-1], None)
+        if step is None:
+            choices.pop()
+            people.pop()
+            if steps:
+                steps.pop()
+            continue
+        movie, previous = step
+        steps.append((movie, people[-1]))
+        if previous == source:
+            yield steps[::-1]
+            steps.pop()
+            continue
+        people.append(previous)
+        choices.append(predecessors(previous))
+
+
+def k_shortest_paths(graph, source, target, k=None):
+    """
+    Lazily yields simple paths from source to target in order of length,
+    stopping after `k` paths if given (Yen's algorithm).
+
+    Each new path is found by deviating from the previous one at every
+    person along it, with the edges already used by earlier paths that
+    share the same prefix removed; candidates wait in a heap until they
+    are the shortest left.
+    """
+    first = bidirectional_path(graph, source, target)
+    if first is None or k == 0:
+        return
+    found = [first]
+    yield first
+
+    candidates = []
+    queued = {tuple(first)}
+    counter = itertools.count()
+    while k is None or len(found) < k:
+        previous = found[-1]
+        people = [source] + [person for _, person in previous]
+        for i in range(len(previous)):
+            root = previous[:i]
+            blocked_edges = {
+                (people[i], path[i][0], path[i][1])
+                for path in found if len(path) > i and path[:i] == root
+            }
+            spur = restricted_path(graph, people[i], target,
+                                   set(people[:i]), blocked_edges)
+            if spur is None:
+                continue
+            candidate = root + spur
+            if tuple(candidate) not in queued:
+                queued.add(tuple(candidate))
+                heapq.heappush(candidates,
+                               (len(candidate), next(counter), candidate))
+        if not candidates:
+            return
+        _, _, path = heapq.heappop(candidates)
+        found.append(path)
+        yield path
+
+
+def restricted_path(graph, source, target, blocked_people, blocked_edges):
+    """
+    Breadth-first search that avoids `blocked_people` and the
+    (person, movie, person) edges in `blocked_edges`.
+    """
+    if source == target:
+        return []
+    parents = {source: None}
+    frontier = deque([source])
+    while frontier:
+        person = frontier.popleft()
+        for movie, neighbor in graph.neighbors(person):
+            if (neighbor in parents or neighbor in blocked_people
+                    or (person, movie, neighbor) in blocked_edges):
+                continue
+            parents[neighbor] = (movie, person)
+            if neighbor == target:
+                path = []
+                while parents[neighbor] is not None:
+                    movie, previous = parents[neighbor]
+                    path.append((movie, neighbor))
+                    neighbor = previous
+                path.reverse()
+                return path
+            frontier.append(neighbor)
+    return None
+
+
+# Point-to-point searches selectable by name
+SEARCHES = {
+    "bfs": breadth_first_path,
+    "bidirectional": bidirectional_path,
+    "landmarks": landmark_path,
+}
+
+
+def separation(graph, source, target):
+    """
+    Returns the degrees of separation between two people, or None if
+    they are not connected. When the landmark bounds agree no search is
+    needed at all.
+    """
+    if not graph.connected(source, target):
+        return None
+    if graph.landmarks is not None:
+        lower, upper = graph.landmarks.bounds(source, target)
+        if lower == math.inf:
+            return None
+        if lower == upper:
+            return lower
+    path = landmark_path(graph, source, target)
+    return None if path is None else len(path)
@@ -0,0 +1,285 @@
+"""
+Resident query server for the Degrees graph.
+
+Loads the graph once and answers JSON queries over HTTP on localhost:
+
+    GET /path?source=...&target=...[&mode=...]   shortest path
+    GET /person?name=...[&match=prefix|fuzzy]    people with a name
+    GET /neighbors?id=...                        co-stars of a person
+    GET /metrics                                 latency and cache stats
+
+`source`, `target` and `id` accept an IMDb person id or a name; shared
+names are settled by the --ambiguous policy and, with --fuzzy,
+misspelled names resolve to the closest match. Path
+searches run in a process pool (see batch.worker_context) so the event
+loop keeps serving cheap requests while they are in flight, and recent
+path answers are kept in an LRU cache.
+
+Usage: python server.py [directory] [--port PORT] [--jobs N]
+                        [--ambiguous POLICY] [--fuzzy]
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+from urllib.parse import parse_qs, urlsplit
+
+import degrees
+from batch import answer_group, init_worker, resolve_person, worker_context
+from lookup import POLICIES, find_people
+from search import SEARCHES
+
+# Latency samples kept per endpoint for the percentiles in /metrics
+LATENCY_SAMPLES = 1000
+
+
+class PathCache():
+    """
+    Least-recently-used cache of path answers.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+
+class Server():
+    """
+    Answers HTTP requests against one loaded graph.
+    """
+
+    def __init__(self, graph, executor, cache_size=10000,
+                 policy="error", fuzzy=False):
+        self.graph = graph
+        self.executor = executor
+        self.policy = policy
+        self.fuzzy = fuzzy
+        self.cache = PathCache(cache_size)
+        self.latencies = {}
+        self.started = time.time()
+
+    async def handle(self, reader, writer):
+        """
+        Serves a single request on a connection, then closes it.
+        """
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            status, body = await self.respond(request.decode("latin-1"))
+        except Exception as e:
+            status, body = 500, {"error": str(e)}
+        payload = json.dumps(body).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + payload
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def respond(self, request_line):
+        """
+        Returns (status, JSON body) for an HTTP request line.
+        """
+        parts = request_line.split()
+        if len(parts) != 3:
+            return 400, {"error": "malformed request"}
+        method, target, _ = parts
+        if method != "GET":
+            return 405, {"error": "only GET is supported"}
+        url = urlsplit(target)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        endpoint = ENDPOINTS.get(url.path)
+        if endpoint is None:
+            return 404, {"error": "unknown endpoint"}
+
+        start = time.perf_counter()
+        status, body = await endpoint(self, params)
+        samples = self.latencies.setdefault(
+            url.path, deque(maxlen=LATENCY_SAMPLES)
+        )
+        samples.append(time.perf_counter() - start)
+        return status, body
+
+    async def path(self, params):
+        mode = params.get("mode", "bidirectional")
+        if mode not in SEARCHES:
+            return 400, {"error": f"unknown search mode: {mode}"}
+        people = []
+        for field in ("source", "target"):
+            if field not in params:
+                return 400, {"error": f"missing {field}"}
+            person, error = resolve_person(self.graph, params[field],
+                                           self.policy, self.fuzzy)
+            if error is not None:
+                return 404, {"error": f"{field}: {error}"}
+            people.append(person)
+        source, target = people
+
+        key = (source, target, mode)
+        path = self.cache.get(key)
+        if path is None:
+            loop = asyncio.get_running_loop()
+            paths = await loop.run_in_executor(
+                self.executor, answer_group, (source, [target], mode)
+            )
+            path = paths[target]
+            # Cache misses stay distinguishable from "not connected"
+            self.cache.put(key, path if path is not None else False)
+        elif path is False:
+            path = None
+        return 200, {
+            "source": self.graph.person_ids[source],
+            "target": self.graph.person_ids[target],
+            "degrees": None if path is None else len(path),
+            "path": path,
+        }
+
+    async def person(self, params):
+        if "name" not in params:
+            return 400, {"error": "missing name"}
+        match = params.get("match", "exact")
+        if match == "exact":
+            people = self.graph.people_named(params["name"])
+        elif match == "prefix":
+            people = self.graph.person_names.find_prefix(params["name"], 20)
+        elif match == "fuzzy":
+            people = find_people(self.graph, params["name"], 20)
+        else:
+            return 400, {"error": f"unknown match: {match}"}
+        return 200, {"people": [self.describe(person) for person in people]}
+
+    async def neighbors(self, params):
+        if "id" not in params:
+            return 400, {"error": "missing id"}
+        person, error = resolve_person(self.graph, params["id"],
+                                       self.policy, self.fuzzy)
+        if error is not None:
+            return 404, {"error": error}
+        neighbors = sorted({
+            (self.graph.movie_ids[movie], self.graph.person_ids[star])
+            for movie, star in self.graph.neighbors(person)
+        })
+        return 200, {"person": self.describe(person), "neighbors": neighbors}
+
+    async def metrics(self, params):
+        endpoints = {}
+        for path, samples in self.latencies.items():
+            ordered = sorted(samples)
+            endpoints[path] = {
+                "samples": len(ordered),
+                "p50_ms": percentile(ordered, 50) * 1000,
+                "p90_ms": percentile(ordered, 90) * 1000,
+                "p99_ms": percentile(ordered, 99) * 1000,
+            }
+        return 200, {
+            "uptime_s": time.time() - self.started,
+            "endpoints": endpoints,
+            "cache": {
+                "entries": len(self.cache.entries),
+                "hits": self.cache.hits,
+                "misses": self.cache.misses,
+            },
+        }
+
+    def describe(self, person):
+        return {
+            "id": self.graph.person_ids[person],
+            "name": self.graph.person_names[person],
+            "birth": self.graph.births[person],
+        }
+
+
+ENDPOINTS = {
+    "/path": Server.path,
+    "/person": Server.person,
+    "/neighbors": Server.neighbors,
+    "/metrics": Server.metrics,
+}
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+def percentile(ordered, p):
+    """
+    Returns the p-th percentile of an already sorted list.
+    """
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, len(ordered) * p // 100)]
+
+
+async def serve(graph, port, jobs, cache_size, policy, fuzzy):
+    with worker_context(graph) as (context, initargs):
+        with concurrent.futures.ProcessPoolExecutor(
+            jobs, mp_context=context,
+            initializer=init_worker, initargs=initargs
+        ) as executor:
+            server = Server(graph, executor, cache_size, policy, fuzzy)
+            listener = await asyncio.start_server(
+                server.handle, "127.0.0.1", port
+            )
+            print(f"Serving on http://127.0.0.1:{port}", file=sys.stderr)
+            async with listener:
+                await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve degrees queries.")
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--jobs", type=degrees.non_negative, default=0,
+                        metavar="N",
+                        help="search worker processes (0 for one per CPU)")
+    parser.add_argument("--cache", type=degrees.non_negative, default=10000,
+                        metavar="N", help="path answers to keep cached")
+    parser.add_argument("--ambiguous", choices=POLICIES, default="error",
+                        help="how to resolve names shared by several people")
+    parser.add_argument("--fuzzy", action="store_true",
+                        help="match misspelled names to the closest name")
+    args = parser.parse_args()
+
+    degrees.load_data(args.directory)
+    try:
+        asyncio.run(serve(degrees.graph, args.port,
+                          args.jobs or os.cpu_count(), args.cache,
+                          args.ambiguous, args.fuzzy))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+import asyncio
+import concurrent.futures
+import csv
+import io
+import json
+import os
+import random
+from array import array
+from collections import deque
+
+import pytest
+
+from batch import resolve_person, run_batch, worker_context
+from graph import SNAPSHOT_NAME, Graph, StringTable, build_csr, csv_signature
+from landmarks import LandmarkIndex
+from lookup import find_people
+import search
+from search import (SEARCHES, all_shortest_paths, k_shortest_paths,
+                    paths_from, separation)
+from server import PathCache, Server
+
+
+def write_dataset(directory, people, movies, stars):
+    """
+    Writes people.csv, movies.csv and stars.csv in the CS50 layout.
+    """
+    tables = [
+        ("people.csv", ["id", "name", "birth"], people),
+        ("movies.csv", ["id", "title", "year"], movies),
+        ("stars.csv", ["person_id", "movie_id"], stars),
+    ]
+    for name, header, rows in tables:
+        with open(directory / name, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+    return directory
+
+
+@pytest.fixture
+def small(tmp_path):
+    """
+    Two people share the name "Kevin Bacon"; person 5 has no movies.
+    """
+    people = [
+        ("1", "Kevin Bacon", "1958"),
+        ("2", "Tom Hanks", "1956"),
+        ("3", "Sally Field", "1946"),
+        ("4", "Kevin Bacon", "1960"),
+        ("5", "Nobody", ""),
+    ]
+    movies = [("10", "Apollo 13", "1995"), ("11", "Forrest Gump", "1994"),
+              ("12", "Solo", "2000")]
+    stars = [("1", "10"), ("2", "10"), ("2", "11"), ("3", "11"),
+             ("4", "11"), ("4", "12"), ("2", "10"), ("99", "10")]
+    directory = tmp_path / "small"
+    directory.mkdir()
+    return write_dataset(directory, people, movies, stars)
+
+
+def test_build_csr_sorts_and_drops_duplicates():
+    rows = array("i", [2, 0, 2, 0, 2])
+    columns = array("i", [5, 3, 1, 3, 5])
+    offsets, indices = build_csr(3, rows, columns)
+    assert list(offsets) == [0, 1, 1, 3]
+    assert list(indices) == [3, 1, 5]
+
+
+def test_string_table_folded_lookup():
+    table = StringTable.build(["Bob", "alice", "BOB", "Carol"], folded=True)
+    assert [table[i] for i in range(len(table))] == ["Bob", "alice", "BOB", "Carol"]
+    assert sorted(table.find_all("bob")) == [0, 2]
+    assert table.find_all("ALICE") == [1]
+    assert table.find_all("dave") == []
+
+
+def test_graph_from_csv(small):
+    graph = Graph.from_csv(small)
+    hanks = graph.person("2")
+    assert sorted(graph.movie_ids[m] for m in graph.movies_of(hanks)) == ["10", "11"]
+    assert sorted(graph.person_ids[p] for p in graph.people_named("kevin bacon")) == ["1", "4"]
+    with pytest.raises(KeyError):
+        graph.person("99")
+
+
+def graph_contents(graph):
+    columns = [[table[i] for i in range(len(table))]
+               for table in (getattr(graph, name) for name in graph.string_columns)]
+    arrays = [list(getattr(graph, name)) for name in graph.array_columns]
+    return columns, arrays
+
+
+def test_snapshot_round_trip(small):
+    built = Graph.from_csv(small)
+    path = small / "copy.snapshot"
+    built.save(path, csv_signature(small))
+    loaded = Graph.load(path, csv_signature(small))
+    assert loaded is not None and loaded.buffer is not None
+    assert graph_contents(loaded) == graph_contents(built)
+    assert sorted(loaded.people_named("KEVIN BACON")) == sorted(built.people_named("kevin bacon"))
+
+
+def test_snapshot_invalidated_by_csv_change(small):
+    Graph.cached(small)
+    path = small / SNAPSHOT_NAME
+    assert Graph.load(path, csv_signature(small)) is not None
+
+    stat = os.stat(small / "stars.csv")
+    os.utime(small / "stars.csv", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert Graph.load(path, csv_signature(small)) is None
+
+    Graph.cached(small)
+    with open(small / "people.csv", "a", encoding="utf-8") as f:
+        f.write("6,New Person,2000\n")
+    assert Graph.load(path, csv_signature(small)) is None
+    assert Graph.cached(small).person("6") == 5
+
+
+def test_truncated_snapshot_is_rebuilt(small):
+    Graph.cached(small)
+    path = small / SNAPSHOT_NAME
+    with open(path, "r+b") as f:
+        f.truncate(200)
+    assert Graph.load(path, csv_signature(small)) is None
+    assert Graph.cached(small).person("3") == 2
+    assert Graph.load(path, csv_signature(small)) is not None
+
+
+@pytest.fixture
+def random_graph(tmp_path):
+    """
+    A sparse random dataset with several components.
+    """
+    generator = random.Random(50)
+    people = [(str(i), f"Person {i}", "") for i in range(400)]
+    movies = [(str(1000 + i), f"Movie {i}", "") for i in range(250)]
+    stars = [(str(generator.randrange(400)), str(1000 + i))
+             for i in range(250) for _ in range(generator.randint(1, 3))]
+    directory = tmp_path / "random"
+    directory.mkdir()
+    return Graph.from_csv(write_dataset(directory, people, movies, stars))
+
+
+def reference_distance(graph, source, target):
+    """
+    Plain breadth-first search over a dict adjacency, for comparison.
+    """
+    distances = {source: 0}
+    queue = deque([source])
+    while queue:
+        person = queue.popleft()
+        if person == target:
+            return distances[person]
+        for _, neighbor in graph.neighbors(person):
+            if neighbor not in distances:
+                distances[neighbor] = distances[person] + 1
+                queue.append(neighbor)
+    return None
+
+
+def assert_valid_path(graph, source, target, path):
+    person = source
+    for movie, following in path:
+        assert person in graph.stars_of(movie)
+        assert following in graph.stars_of(movie)
+        person = following
+    assert person == target
+
+
+def test_searches_match_reference(random_graph):
+    generator = random.Random(7)
+    for _ in range(300):
+        source = generator.randrange(random_graph.person_count)
+        target = generator.randrange(random_graph.person_count)
+        expected = reference_distance(random_graph, source, target)
+        for search in SEARCHES.values():
+            path = search(random_graph, source, target)
+            if expected is None:
+                assert path is None
+            else:
+                assert len(path) == expected
+                assert_valid_path(random_graph, source, target, path)
+
+
+def test_paths_from_matches_reference(random_graph):
+    generator = random.Random(8)
+    for source in range(0, random_graph.person_count, 40):
+        targets = {generator.randrange(random_graph.person_count)
+                   for _ in range(10)}
+        paths = paths_from(random_graph, source, targets)
+        assert set(paths) == targets
+        for target, path in paths.items():
+            expected = reference_distance(random_graph, source, target)
+            if expected is None:
+                assert path is None
+            else:
+                assert len(path) == expected
+                assert_valid_path(random_graph, source, target, path)
+
+
+def test_run_batch_writes_one_record_per_query(small):
+    graph = Graph.from_csv(small)
+    queries = [
+        (1, "3", "1"),
+        (2, "Kevin Bacon", "2"),
+        (3, "Missing Person", "2"),
+        (4, "3", "Tom Hanks"),
+        (5, "5", "1"),
+    ]
+    output = io.StringIO()
+    run_batch(graph, queries, output)
+    records = {record["line"]: record
+               for record in map(json.loads, output.getvalue().splitlines())}
+    assert sorted(records) == [1, 2, 3, 4, 5]
+    assert records[1]["degrees"] == 2
+    assert [step[1] for step in records[1]["path"]] == ["2", "1"]
+    assert records[2]["error"] == "ambiguous name"
+    assert records[3]["error"] == "person not found"
+    assert records[4]["degrees"] == 1
+    assert records[5]["degrees"] is None and records[5]["path"] is None
+
+
+def test_landmark_bounds_and_search(random_graph, tmp_path):
+    index = LandmarkIndex.build(random_graph, count=6)
+    index.save(tmp_path / "index")
+    random_graph.landmarks = LandmarkIndex.load(tmp_path / "index", random_graph)
+    assert list(random_graph.landmarks.landmarks) == list(index.landmarks)
+
+    generator = random.Random(9)
+    for _ in range(300):
+        source = generator.randrange(random_graph.person_count)
+        target = generator.randrange(random_graph.person_count)
+        expected = reference_distance(random_graph, source, target)
+        lower, upper = random_graph.landmarks.bounds(source, target)
+        if expected is not None:
+            assert lower <= expected <= upper
+        assert separation(random_graph, source, target) == expected
+        path = SEARCHES["landmarks"](random_graph, source, target)
+        assert (path is None) == (expected is None)
+        if path is not None:
+            assert len(path) == expected
+            assert_valid_path(random_graph, source, target, path)
+
+
+def test_landmark_index_rejects_other_graph(random_graph, small, tmp_path):
+    LandmarkIndex.build(random_graph, count=2).save(tmp_path / "index")
+    assert LandmarkIndex.load(tmp_path / "index", Graph.from_csv(small)) is None
+
+
+def test_components_match_reachability(random_graph):
+    generator = random.Random(10)
+    for _ in range(200):
+        source = generator.randrange(random_graph.person_count)
+        target = generator.randrange(random_graph.person_count)
+        connected = reference_distance(random_graph, source, target) is not None
+        assert random_graph.connected(source, target) == connected
+    sizes = [0] * len(random_graph.component_sizes)
+    for label in random_graph.components:
+        sizes[label] += 1
+    assert sizes == list(random_graph.component_sizes)
+
+
+def test_path_cache_evicts_least_recently_used():
+    cache = PathCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_server_endpoints(small):
+    graph = Graph.from_csv(small)
+
+    async def requests():
+        with worker_context(graph):
+            with concurrent.futures.ThreadPoolExecutor(1) as executor:
+                server = Server(graph, executor)
+                return [
+                    await server.respond(f"GET {target} HTTP/1.1")
+                    for target in ("/path?source=3&target=1",
+                                   "/path?source=3&target=1",
+                                   "/path?source=Kevin+Bacon&target=2",
+                                   "/person?name=kevin+bacon",
+                                   "/neighbors?id=3",
+                                   "/metrics",
+                                   "/missing")
+                ]
+
+    path, cached, ambiguous, person, neighbors, metrics, missing = asyncio.run(requests())
+    assert path == cached
+    assert path[1]["degrees"] == 2
+    assert ambiguous[0] == 404
+    assert sorted(p["id"] for p in person[1]["people"]) == ["1", "4"]
+    assert [step[1] for step in neighbors[1]["neighbors"]] == ["2", "3", "4"]
+    assert metrics[1]["cache"]["hits"] == 1
+    assert metrics[1]["endpoints"]["/path"]["samples"] == 3
+    assert missing[0] == 404
+
+
+def test_prefix_and_fuzzy_lookup(small):
+    graph = Graph.from_csv(small)
+    names = lambda people: sorted(graph.person_names[p] for p in people)
+    assert names(graph.person_names.find_prefix("kev")) == ["Kevin Bacon"] * 2
+    assert names(graph.person_names.find_prefix("t", limit=1)) == ["Tom Hanks"]
+    assert names(find_people(graph, "Tom Hank")) == ["Tom Hanks"]
+    assert names(find_people(graph, "Sally Feild")) == ["Sally Field"]
+    assert find_people(graph, "zzzz") == []
+
+
+def test_resolve_person_policies(small):
+    graph = Graph.from_csv(small)
+    assert resolve_person(graph, "Kevin Bacon") == (None, "ambiguous name")
+    # Person 4 starred in two movies, person 1 in one
+    assert resolve_person(graph, "Kevin Bacon", "most-connected") == (3, None)
+    assert resolve_person(graph, "Tom Hnaks") == (None, "person not found")
+    assert resolve_person(graph, "Tom Hnaks", fuzzy=True) == (1, None)
+
+
+def test_workspace_marks_wrap_around(random_graph, monkeypatch):
+    monkeypatch.setattr(search, "MAX_MARK", 7)
+    generator = random.Random(11)
+    for _ in range(50):
+        source = generator.randrange(random_graph.person_count)
+        target = generator.randrange(random_graph.person_count)
+        expected = reference_distance(random_graph, source, target)
+        for search_path in SEARCHES.values():
+            path = search_path(random_graph, source, target)
+            assert (None if path is None else len(path)) == expected
+    assert search.workspace(random_graph).mark <= 7
+
+
+@pytest.fixture
+def tiny_graph(tmp_path):
+    generator = random.Random(12)
+    people = [(str(i), f"Person {i}", "") for i in range(12)]
+    movies = [(str(100 + i), f"Movie {i}", "") for i in range(10)]
+    stars = [(str(generator.randrange(12)), str(100 + i))
+             for i in range(10) for _ in range(3)]
+    directory = tmp_path / "tiny"
+    directory.mkdir()
+    return Graph.from_csv(write_dataset(directory, people, movies, stars))
+
+
+def simple_paths(graph, source, target):
+    """
+    Every simple path from source to target, by exhaustive search.
+    """
+    paths = []
+
+    def extend(person, path, visited):
+        if person == target:
+            paths.append(list(path))
+            return
+        for movie, neighbor in sorted(set(graph.neighbors(person))):
+            if neighbor not in visited:
+                path.append((movie, neighbor))
+                extend(neighbor, path, visited | {neighbor})
+                path.pop()
+
+    extend(source, [], {source})
+    return paths
+
+
+def test_all_and_k_shortest_paths(tiny_graph):
+    for source in range(tiny_graph.person_count):
+        for target in range(tiny_graph.person_count):
+            if source == target:
+                continue
+            expected = simple_paths(tiny_graph, source, target)
+            shortest = sorted(all_shortest_paths(tiny_graph, source, target))
+            ranked = list(k_shortest_paths(tiny_graph, source, target))
+            if not expected:
+                assert shortest == [] and ranked == []
+                continue
+            length = min(len(path) for path in expected)
+            assert shortest == sorted(p for p in expected if len(p) == length)
+            assert sorted(ranked) == sorted(expected)
+            assert [len(p) for p in ranked] == sorted(len(p) for p in expected)
+            assert list(k_shortest_paths(tiny_graph, source, target, 2)) == ranked[:2]